@@ -1,4 +1,5 @@
 import random
+from array import array
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
@@ -104,72 +105,50 @@ class Highway:
     def __init__(self, length, num_def_lanes, num_sd_lanes):
         self.num_def_lanes = num_def_lanes
         self.num_sd_lanes = num_sd_lanes
-        self.road = [] #2d array representing highway (each secondary array within the main array represents a lane)
-        for _ in range(num_def_lanes+num_sd_lanes):
-            self.road.append([]) #appends the number of lanes specified
-        
+        self.occ = [array('b', [0]*length) for _ in range(num_def_lanes+num_sd_lanes)] #2d array representing highway (each secondary array represents a lane), 1 where there is a car and 0 where it is EMPTY
+        self.drivers = {} #Driver at each occupied (lane, index) position
         self.length = length
-        for _ in range(length):
-            for i in range(num_def_lanes+num_sd_lanes):
-                self.road[i].append(EMPTY)
 
     #Returns the value at the specified position within the specified lane
     def get(self, lane, index):
-        return self.road[lane][index]
+        return self.drivers.get((lane, index), EMPTY)
 
     #Sets the value at the specified position within the specified lane
     def set(self, lane, index, value):
-        self.road[lane][index] = value
+        if value == EMPTY:
+            self.occ[lane][index] = 0
+            self.drivers.pop((lane, index), None)
+        else:
+            self.occ[lane][index] = 1
+            self.drivers[(lane, index)] = value
 
     #Returns the distance until the next car, from index i within k; returns k if all spots are EMPTY
     def safe_distance_within(self, lane, index, k):
-        x = 0
-        for i in range(index + 1, index + k + 1):
-            if i >= self.length:
-                return k
-            if self.road[lane][i] != EMPTY:
-                return x
-            x += 1
-        return x
+        ahead = self.occ[lane][index + 1:index + k + 1]
+        if 1 not in ahead:
+            return k
+        return ahead.index(1)
 
     #Returns true if it is safe to switch to right lane (spot adjacent to the car's current position in the right lane is free, and so are the next 2 spaces)
     #Returns false otherwise
     def safe_right_lane_change(self, lane, i):
-        if lane == self.num_def_lanes - 1:
+        if lane == self.num_def_lanes - 1 or lane == len(self.occ) - 1:
             return False
-        safe_lane_change = True
-        if self.road[lane + 1][i] != EMPTY:
-            safe_lane_change = False
-        for k in range(i - 1, i - LANE_CHANGE_SAFE_BACK - 1, -1):
-            if self.road[lane + 1][k] != EMPTY:
-                safe_lane_change = False
-        for k in range(i + 1, i + LANE_CHANGE_SAFE_FORWARD + 1):
-            if self.road[lane + 1][k] != EMPTY:
-                safe_lane_change = False
-        return safe_lane_change
+        return not any(self.occ[lane + 1][max(0, i - LANE_CHANGE_SAFE_BACK):i + LANE_CHANGE_SAFE_FORWARD + 1])
 
     #Returns true if it is safe to switch to left lane (spot adjacent to the car's current position in the left lane is free, and so are the next 2 spaces)
     #Returns false otherwise
     def safe_left_lane_change(self, lane, i):
         if lane == 0 or (lane==1 and HAS_ON_RAMP and i<(HIGHWAY_LENGTH/4)):  #
             return False
-        safe_lane_change = True
-        if self.road[lane - 1][i] != EMPTY:
-            safe_lane_change = False
-        for k in range(i - 1, i - LANE_CHANGE_SAFE_BACK - 1, -1):
-            if self.road[lane - 1][k] != EMPTY:
-                safe_lane_change = False
-        for k in range(i + 1, i + LANE_CHANGE_SAFE_FORWARD + 1):
-            if self.road[lane - 1][k] != EMPTY:
-                safe_lane_change = False
-        return safe_lane_change
+        return not any(self.occ[lane - 1][max(0, i - LANE_CHANGE_SAFE_BACK):i + LANE_CHANGE_SAFE_FORWARD + 1])
     
     #Prints the current state of the highway- good to see the visual representation and for debugging
     def print(self):
         s = "\n\n"
         for k in range(self.num_def_lanes):  ## TODO fix print
             for i in range(self.length):
-                if self.road[k][i] == EMPTY:
+                if not self.occ[k][i]:
                     s += "_"
                 else:
                     driver = self.get(k,i)
@@ -180,7 +159,7 @@ class Highway:
             s += "\n"
         for k in range(self.num_sd_lanes):
             for i in range(self.length):
-                if self.road[k+self.num_def_lanes-1][i] == EMPTY:
+                if not self.occ[k+self.num_def_lanes-1][i]:
                     s += "~"
                 else:
                     s += "S"
@@ -211,7 +190,7 @@ class Simulation:
         for i in range(self.road.length - 1, -1, -1):
 
             for k in range(self.road.num_def_lanes+self.road.num_sd_lanes):
-                if self.road.get(k, i) != EMPTY:
+                if self.road.occ[k][i]:
                     self.sim_driver(k, i) #Simulates all drivers starting at the end of the highway and starting with the leftmost lane then moving right
 
         #Generate some new drivers at the beginning of the highway
@@ -230,20 +209,20 @@ class Simulation:
             self.data.append(driver.output_data())
             return
 
-        #Decides if a car that wants to do a lane change will go left or right
-        r = random.random()
-        if driver.desire == LANE_CHANGE and r <= LEFT_LANE_CHANGE_PROBABILITY:
-            if self.road.safe_left_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_LEFT
-            elif self.road.safe_right_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_RIGHT
-        elif driver.desire == LANE_CHANGE and r > LEFT_LANE_CHANGE_PROBABILITY:
-            if self.road.safe_right_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_RIGHT
-            elif self.road.safe_left_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_LEFT
+        #Decides if a car that wants to do a lane change will go left or right, trying the side it picked first
+        if driver.desire == LANE_CHANGE:
+            if random.random() <= LEFT_LANE_CHANGE_PROBABILITY:
+                if self.road.safe_left_lane_change(lane, i):
+                    driver.desire = LANE_CHANGE_LEFT
+                elif self.road.safe_right_lane_change(lane, i):
+                    driver.desire = LANE_CHANGE_RIGHT
+            else:
+                if self.road.safe_right_lane_change(lane, i):
+                    driver.desire = LANE_CHANGE_RIGHT
+                elif self.road.safe_left_lane_change(lane, i):
+                    driver.desire = LANE_CHANGE_LEFT
 
-        if (not driver.is_human) and lane < NUM_DEF_LANES: # if sd outside sd only section, try to go left
+        if driver.desire != LANE_CHANGE_RIGHT and (not driver.is_human) and lane < NUM_DEF_LANES: # if sd outside sd only section, try to go left
             if self.road.safe_right_lane_change(lane, i):
                 driver.desire = LANE_CHANGE_RIGHT
 
@@ -12,20 +12,21 @@ See the video for more detail.
 Dr. Vincent Maccio 2022-02-01 
 """
 
-EMPTY = " "
+EMPTY = 0
 #You can think of these speeds as 125 and 100 km/hr
 FAST = 5
 SLOW = 4
 SAFE_FOLLOW = 4
 LEFT = 0
 RIGHT = 1
-CRUISE = "Cruise"
-LANE_CHANGE = "Lane Change"
+CRUISE = 0
+LANE_CHANGE = 1
 OFFSET = 5 #The last OFFSET indices of the road are not considered to avoid out of bounds errors
 CAR_PROBABILITY = 0.5
 FAST_PROBABILITY = 0.5
 PRINT_ROAD = False
 HIGHWAY_LENGTH = 300
+LANE_CHARS = bytes.maketrans(b"\x00\x01", b"_C") #Characters used to print EMPTY and occupied spots
 
 #Class for each car
 class Driver:
@@ -41,11 +42,9 @@ class Driver:
 class Highway:
 
     def __init__(self, length):
-        self.road = [[], []] #2d array representing highway (each secondary array within the main array represents a lane- here we have 2)
+        self.road = [[EMPTY]*length, [EMPTY]*length] #2d array representing highway (each secondary array within the main array represents a lane- here we have 2)
+        self.occ = [bytearray(length), bytearray(length)] #Same layout as road, holding 1 where there is a car and 0 where the road is EMPTY
         self.length = length
-        for _ in range(length):
-            self.road[0].append(EMPTY)
-            self.road[1].append(EMPTY)
     
     #For you to edit as you see fit
     def can_lane_change(self, lane, i):
@@ -58,43 +57,32 @@ class Highway:
     #Sets the value at the specified position within the specified lane
     def set(self, lane, index, value):
         self.road[lane][index] = value
+        self.occ[lane][index] = value != EMPTY
 
     #Returns the distance until the next car, from index i within k; returns k if all spots are EMPTY
     def safe_distance_within(self, lane, index, k):
-        x = 0
-        for i in range(index + 1, index + k + 1):
-            if i >= self.length:
-                return k
-            if self.road[lane][i] != EMPTY:
-                return x
-            x += 1
-        return x
+        i = self.occ[lane].find(1, index + 1, index + k + 1)
+        if i == -1:
+            return k
+        return i - index - 1
 
     #Returns true if it is safe to switch to right lane (spot adjacent to the car's current position in the right lane is free, and so are the next 2 spaces)
     #Returns false otherwise
     def safe_right_lane_change(self, i):
-        return self.road[RIGHT][i] == EMPTY and self.road[RIGHT][i+1] == EMPTY and self.road[RIGHT][i+2] == EMPTY
+        return 1 not in self.occ[RIGHT][i:i+3]
     
     #Returns true if it is safe to switch to left lane (spot adjacent to the car's current position in the left lane is free, and so are the next 2 spaces)
     #Returns false otherwise
     def safe_left_lane_change(self, i):
-        return self.road[LEFT][i] == EMPTY and self.road[LEFT][i+1] == EMPTY and self.road[LEFT][i+2] == EMPTY
+        return 1 not in self.occ[LEFT][i:i+3]
 
     #Prints the current state of the highway- good to see the visual representation and for debugging
     def print(self):
         s = "\n"
         #There is one for statement for each lane here- if you are changing the number of lanes you will need to modify this code
-        for i in range(self.length):
-            if self.road[0][i] == EMPTY:
-                s += "_"
-            else:
-                s += "C"
+        s += self.occ[0].translate(LANE_CHARS).decode()
         s += "\n"
-        for i in range(self.length):
-            if self.road[1][i] == EMPTY:
-                s += "_"
-            else:
-                s += "C"
+        s += self.occ[1].translate(LANE_CHARS).decode()
         print(s)
 
 #Simulation class
@@ -117,16 +105,21 @@ class Simulation:
     #Move forward by one time unit
     def execute_time_step(self):
 
+        left_lane = self.road.occ[LEFT]
+        right_lane = self.road.occ[RIGHT]
+        sim_left_driver = self.sim_left_driver
+        sim_right_driver = self.sim_right_driver
+
         #Traverse through the length of the highway, beginning from the end and working backwards
         for i in range(self.road.length - 1, -1, -1):
 
             #If there is a driver at this position in the left lane, move them and attempt to perform their desired actions
-            if self.road.get(LEFT, i) != EMPTY:
-                self.sim_left_driver(i)
+            if left_lane[i]:
+                sim_left_driver(i)
 
             #If there is a driver at this position in the right lane, move them and attempt to perform their desired actions
-            if self.road.get(RIGHT, i) != EMPTY:
-                self.sim_right_driver(i)
+            if right_lane[i]:
+                sim_right_driver(i)
 
         #Generate some new drivers at the beginning of the highway
         self.gen_new_drivers()
@@ -187,22 +180,29 @@ class Simulation:
     def sim_cruise(self, lane, i):
 
         #Get car information for specific lane and position
-        driver = self.road.get(lane, i)
+        road = self.road.road[lane]
+        occ = self.road.occ[lane]
+        driver = road[i]
+        speed = driver.speed
+        safe_follow = driver.safe_follow
 
-        x = self.road.safe_distance_within(lane, i, driver.speed + driver.safe_follow)
+        x = self.road.safe_distance_within(lane, i, speed + safe_follow)
 
         #If there is enough room for the car to move forward at full speed
-        if x == driver.speed + driver.safe_follow:
-            self.road.set(lane, i + driver.speed, driver) #Car moves forward by full speed
+        if x == speed + safe_follow:
+            new_i = i + speed #Car moves forward by full speed
         
         #If the car is not within unsafe following distance but cannot move forward by it's full speed
-        elif x > driver.safe_follow:
+        elif x > safe_follow:
             driver.desire = LANE_CHANGE
-            self.road.set(lane, i + x - driver.safe_follow, driver) #Car moves forward just enough to maintain safe_distance
+            new_i = i + x - safe_follow #Car moves forward just enough to maintain safe_distance
         else:
             driver.desire = LANE_CHANGE
-            self.road.set(lane, i + 1, driver) #Car moves forward by just 1 spot
-        self.road.set(lane, i, EMPTY)
+            new_i = i + 1 #Car moves forward by just 1 spot
+        road[new_i] = driver
+        occ[new_i] = 1
+        road[i] = EMPTY
+        occ[i] = 0
 
     #Randomly generate new drivers entering the highway
     def gen_new_drivers(self):
@@ -1,7 +1,8 @@
-import random
+import sys
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
+from numba import njit
 
 """
 2PX3 Highway Simulation Starting Code 
@@ -15,7 +16,7 @@ See the video for more detail.
 Dr. Vincent Maccio 2022-02-01 
 """
 
-EMPTY = " "
+EMPTY = 0
 
 """
 The following variables control the different factors of the simulation.
@@ -39,10 +40,10 @@ LANE_CHANGE_SAFE_BACK = FAST
 LANE_CHANGE_SAFE_FORWARD = FAST
 
 #Desires:
-CRUISE = "Cruise"
-LANE_CHANGE = "Lane Change"
-LANE_CHANGE_LEFT = "Left Lane Change"
-LANE_CHANGE_RIGHT = "Right Lane Change"
+CRUISE = 0
+LANE_CHANGE = 1
+LANE_CHANGE_LEFT = 2
+LANE_CHANGE_RIGHT = 3
 LEFT_LANE_CHANGE_PROBABILITY = 0.5 #Probability that a car that wants to perform a lane change will pick to go left
 
 #Car generation options
@@ -54,37 +55,142 @@ IS_HUMAN_PROBABILITY = 0.5
 #Simulation options
 NUM_TIME_STEPS = 10000
 PRINT_ROAD = True
+PRINT_EVERY = 100 #When printing the road, only print it once every this many time steps
 NUM_BARS = 15 #Number of bars in the output bar graph
 
-#Class for each car
-class Driver:
+"""
+Compiled kernels over the occupancy grid. The grid holds the id of the car at each position (0 = empty)
+and everything the kernels need to know about a car is kept in the CarPool arrays indexed by that id.
+"""
 
-    def __init__(self, car_id, speed, arrive_time, is_human):
-        self.id = car_id
-        self.desire = CRUISE
-        self.is_human = is_human
-        self.speed = speed
+#Returns the distance until the next car in the lane, from index within k; returns k if all spots are empty
+@njit(cache=True)
+def safe_distance_within_nb(occ, lane, index, k, length):
+    #The scan stops at the end of the road up front so the loop body is just the compare
+    for i in range(index + 1, min(index + k + 1, length)):
+        if occ[lane, i]:
+            return i - index - 1
+    return k
+
+#Returns true if the spot in the lane to the right is free, along with back spots behind it and fwd spots in front of it
+@njit(cache=True)
+def safe_right_lane_change_nb(occ, lane, i, back, fwd, num_def_lanes):
+    if lane == num_def_lanes - 1:
+        return False
+    return not np.any(occ[lane + 1, max(0, i - back):i + fwd + 1])
+
+#Returns true if the spot in the lane to the left is free, along with back spots behind it and fwd spots in front of it
+@njit(cache=True)
+def safe_left_lane_change_nb(occ, lane, i, back, fwd):
+    if lane == 0:
+        return False
+    return not np.any(occ[lane - 1, max(0, i - back):i + fwd + 1])
+
+#Moves the car at position src in lane src_lane to position dst in lane dst_lane
+@njit(cache=True)
+def _move(occ, src_lane, src, dst_lane, dst):
+    occ[dst_lane, dst] = occ[src_lane, src]
+    occ[src_lane, src] = EMPTY
+
+#Moves every car on the highway forward by one time unit, one lane at a time from the leftmost lane to the rightmost,
+#beginning from the end of each lane and working backwards
+#Sweeping lane by lane changes what a car sees when it changes lanes: the lane to its left has already moved this step,
+#including cars that started behind it, while the lane to its right has not moved yet
+#randoms holds one random number for every spot on the highway, used by the car at that spot to pick a lane change direction
+#The ids of the cars that reach the end of each lane are written to that lane's row of completed, and how many there were to n_completed
+@njit(cache=True)
+def step(occ, speed, safe_follow, desire, last_step, current_step, num_def_lanes, randoms, completed, n_completed):
+    num_lanes, length = occ.shape
+    for lane in range(num_lanes): #Each lane is a contiguous row of occ, so it is swept in memory order
+        n = 0
+        #Only the occupied spots are visited; cars only move forward, so the spots behind the one being simulated don't change
+        for i in np.flatnonzero(occ[lane])[::-1]:
+            cid = occ[lane, i]
+
+            #A car that moved right into a lane that has not been swept yet has already been simulated this step
+            if last_step[cid] == current_step:
+                continue
+            last_step[cid] = current_step
+
+            #If the driver reaches the end of the highway then remove them and record them as completed
+            if speed[cid] + i >= length - 1:
+                occ[lane, i] = EMPTY
+                completed[lane, n] = cid
+                n += 1
+                continue
+
+            #Decides if a car that wants to do a lane change will go left or right
+            r = randoms[lane, i]
+            if desire[cid] == LANE_CHANGE and r <= LEFT_LANE_CHANGE_PROBABILITY:
+                if safe_left_lane_change_nb(occ, lane, i, LANE_CHANGE_SAFE_BACK, LANE_CHANGE_SAFE_FORWARD):
+                    desire[cid] = LANE_CHANGE_LEFT
+                elif safe_right_lane_change_nb(occ, lane, i, LANE_CHANGE_SAFE_BACK, LANE_CHANGE_SAFE_FORWARD, num_def_lanes):
+                    desire[cid] = LANE_CHANGE_RIGHT
+            elif desire[cid] == LANE_CHANGE and r > LEFT_LANE_CHANGE_PROBABILITY:
+                if safe_right_lane_change_nb(occ, lane, i, LANE_CHANGE_SAFE_BACK, LANE_CHANGE_SAFE_FORWARD, num_def_lanes):
+                    desire[cid] = LANE_CHANGE_RIGHT
+                elif safe_left_lane_change_nb(occ, lane, i, LANE_CHANGE_SAFE_BACK, LANE_CHANGE_SAFE_FORWARD):
+                    desire[cid] = LANE_CHANGE_LEFT
+
+            #Performs lane change if necessary then cruises
+            if desire[cid] == LANE_CHANGE_RIGHT:
+                desire[cid] = CRUISE
+                new_lane = lane + 1
+            elif desire[cid] == LANE_CHANGE_LEFT:
+                desire[cid] = CRUISE
+                new_lane = lane - 1
+            else:
+                new_lane = lane
+
+            #Moves car forward depending on its speed and how much room is infront of it, also sets desire to lane change if there is no room in front
+            x = safe_distance_within_nb(occ, new_lane, i, speed[cid] + safe_follow[cid], length)
+            if x == speed[cid] + safe_follow[cid]:
+                new_i = i + speed[cid] #Car moves forward by full speed
+            elif x > safe_follow[cid]:
+                desire[cid] = LANE_CHANGE
+                new_i = i + x - safe_follow[cid] #Car moves forward just enough to maintain safe_distance
+            else:
+                desire[cid] = LANE_CHANGE
+                new_i = i + 1 #Car moves forward by just 1 spot
+
+            #The lane change and the move forward are done as a single move on the grid
+            _move(occ, lane, i, new_lane, new_i)
+        n_completed[lane] = n
+
+#Data for every car in the simulation, kept as one array per field and indexed by car id
+#(id 0 is never used since it marks an empty spot on the road)
+class CarPool:
+
+    def __init__(self, max_cars):
+        self.speed = np.zeros(max_cars, dtype=np.int8)
+        self.safe_follow = np.zeros(max_cars, dtype=np.int8)
+        self.desire = np.zeros(max_cars, dtype=np.int8)
+        self.is_human = np.zeros(max_cars, dtype=np.bool_)
+        self.arrive_time = np.zeros(max_cars, dtype=np.int32)
+        self.last_step = np.full(max_cars, -1, dtype=np.int32) #Last time step each car was simulated in
+
+    #Sets up the data for a car entering the highway
+    def add(self, car_id, speed, arrive_time, is_human):
+        self.speed[car_id] = speed
         if is_human:
-            self.safe_follow = HUMAN_SAFE_FOLLOW
+            self.safe_follow[car_id] = HUMAN_SAFE_FOLLOW
         else:
-            self.safe_follow = SDC_SAFE_FOLLOW
-        self.arrive_time = arrive_time
-        self.final_time = 0
-        self.travel_time = 0
-        self.final_dist = 0
-        self.avg_speed = speed
-
-    #Outputs an array with all of the data for the car
-    def output_data(self):
-        output_data = [self.id,
-                       self.speed,
-                       self.is_human,
-                       self.arrive_time,
-                       self.final_time,
-                       self.travel_time,
-                       self.final_dist,
-                       self.avg_speed]
-        return output_data
+            self.safe_follow[car_id] = SDC_SAFE_FOLLOW
+        self.desire[car_id] = CRUISE
+        self.is_human[car_id] = is_human
+        self.arrive_time[car_id] = arrive_time
+
+    #Outputs a row with all of the data for a car that left the highway at final_time
+    def output_data(self, car_id, final_time):
+        travel_time = final_time - self.arrive_time[car_id]
+        return (car_id,
+                self.speed[car_id],
+                self.is_human[car_id],
+                self.arrive_time[car_id],
+                final_time,
+                travel_time,
+                HIGHWAY_LENGTH,
+                HIGHWAY_LENGTH/travel_time)
 
 #Highway class
 class Highway:
@@ -92,232 +198,128 @@ class Highway:
     def __init__(self, length, num_def_lanes, num_sd_lanes):
         self.num_def_lanes = num_def_lanes
         self.num_sd_lanes = num_sd_lanes
-        self.road = [] #2d array representing highway (each secondary array within the main array represents a lane)
-        for _ in range(num_def_lanes+num_sd_lanes):
-            self.road.append([]) #appends the number of lanes specified
-        
         self.length = length
-        for _ in range(length):
-            for i in range(num_def_lanes+num_sd_lanes):
-                self.road[i].append(EMPTY)
+        #2d grid representing highway (each row represents a lane), holding the id of the car at each position or EMPTY where there is none
+        self.occ = np.zeros((num_def_lanes+num_sd_lanes, length), dtype=np.int32)
 
-    #Returns the value at the specified position within the specified lane
+    #Returns the id of the car at the specified position within the specified lane (EMPTY if there is none)
     def get(self, lane, index):
-        return self.road[lane][index]
+        return self.occ[lane, index]
 
-    #Sets the value at the specified position within the specified lane
-    def set(self, lane, index, value):
-        self.road[lane][index] = value
+    #Sets the car id at the specified position within the specified lane
+    def set(self, lane, index, car_id):
+        self.occ[lane, index] = car_id
 
     #Returns the distance until the next car, from index i within k; returns k if all spots are EMPTY
     def safe_distance_within(self, lane, index, k):
-        x = 0
-        for i in range(index + 1, index + k + 1):
-            if i >= self.length:
-                return k
-            if self.road[lane][i] != EMPTY:
-                return x
-            x += 1
-        return x
+        return safe_distance_within_nb(self.occ, lane, index, k, self.length)
 
     #Returns true if it is safe to switch to right lane (spot adjacent to the car's current position in the right lane is free, and so are the next 2 spaces)
     #Returns false otherwise
     def safe_right_lane_change(self, lane, i):
-        if lane == self.num_def_lanes - 1:
-            return False
-        safe_lane_change = True
-        if self.road[lane + 1][i] != EMPTY:
-            safe_lane_change = False
-        for k in range(i - 1, i - LANE_CHANGE_SAFE_BACK - 1, -1):
-            if self.road[lane + 1][k] != EMPTY:
-                safe_lane_change = False
-        for k in range(i + 1, i + LANE_CHANGE_SAFE_FORWARD + 1):
-            if self.road[lane + 1][k] != EMPTY:
-                safe_lane_change = False
-        return safe_lane_change
+        return safe_right_lane_change_nb(self.occ, lane, i, LANE_CHANGE_SAFE_BACK, LANE_CHANGE_SAFE_FORWARD, self.num_def_lanes)
 
     #Returns true if it is safe to switch to left lane (spot adjacent to the car's current position in the left lane is free, and so are the next 2 spaces)
     #Returns false otherwise
     def safe_left_lane_change(self, lane, i):
-        if lane == 0:
-            return False
-        safe_lane_change = True
-        if self.road[lane - 1][i] != EMPTY:
-            safe_lane_change = False
-        for k in range(i - 1, i - LANE_CHANGE_SAFE_BACK - 1, -1):
-            if self.road[lane - 1][k] != EMPTY:
-                safe_lane_change = False
-        for k in range(i + 1, i + LANE_CHANGE_SAFE_FORWARD + 1):
-            if self.road[lane - 1][k] != EMPTY:
-                safe_lane_change = False
-        return safe_lane_change
+        return safe_left_lane_change_nb(self.occ, lane, i, LANE_CHANGE_SAFE_BACK, LANE_CHANGE_SAFE_FORWARD)
     
     #Prints the current state of the highway- good to see the visual representation and for debugging
     def print(self):
-        s = "\n\n"
-        for k in range(self.num_def_lanes):
-            for i in range(self.length):
-                if self.road[k][i] == EMPTY:
-                    s += "_"
-                else:
-                    s += "C"
-            s += "\n"
-        for k in range(self.num_sd_lanes):
-            for i in range(self.length):
-                if self.road[k+self.num_def_lanes-1][i] == EMPTY:
-                    s += "~"
-                else:
-                    s += "S"
-            s += "\n"
-        print(s)
+        lanes = ["".join(np.where(self.occ[k] != EMPTY, "C", "_")) for k in range(self.num_def_lanes)]
+        lanes += ["".join(np.where(self.occ[k+self.num_def_lanes-1] != EMPTY, "S", "~")) for k in range(self.num_sd_lanes)]
+        sys.stdout.write("\n\n" + "".join(lane + "\n" for lane in lanes) + "\n")
 
 #Simulation class
 class Simulation:
-    def __init__(self, time_steps):
+    def __init__(self, time_steps, seed=None):
         self.road = Highway(HIGHWAY_LENGTH, NUM_DEF_LANES, NUM_SD_LANES)
+        self.rng = np.random.default_rng(seed)
         self.time_steps = time_steps
         self.current_step = 0
         self.num_cars = 0
-        self.data = []
+        max_cars = time_steps * (NUM_DEF_LANES + NUM_SD_LANES) + 1
+        self.cars = CarPool(max_cars)
+        self.data = np.empty((max_cars, 8)) #One row of output data per car that reached the end of the highway, in the order they did
+        self.num_finished = 0
+        self.completed = np.zeros((NUM_DEF_LANES + NUM_SD_LANES, HIGHWAY_LENGTH), dtype=np.int32)
+        self.n_completed = np.zeros(NUM_DEF_LANES + NUM_SD_LANES, dtype=np.int32)
+
+        #Run the step kernel once on an empty highway so it is compiled (or loaded from the cache) before the first real step
+        cars = self.cars
+        step(np.zeros_like(self.road.occ), cars.speed, cars.safe_follow, cars.desire, cars.last_step, self.current_step,
+             self.road.num_def_lanes, np.zeros(self.road.occ.shape), self.completed, self.n_completed)
 
     #Method that runs the simulation
     def run(self):
         while self.current_step < self.time_steps:
             self.execute_time_step()
             self.current_step += 1
-            if PRINT_ROAD:
+            if PRINT_ROAD and self.current_step % PRINT_EVERY == 0:
                 self.road.print()
 
     #Move forward by one time unit
     def execute_time_step(self):
+        #All the random numbers needed for this step are drawn at once
+        num_lanes = self.road.num_def_lanes + self.road.num_sd_lanes
+        lane_change_randoms = self.rng.random((num_lanes, self.road.length))
+        gen_randoms = self.rng.random((num_lanes, 2))
 
-        #Traverse through the length of the highway, beginning from the end and working backwards
-        for i in range(self.road.length - 1, -1, -1):
+        cars = self.cars
+        step(self.road.occ, cars.speed, cars.safe_follow, cars.desire, cars.last_step, self.current_step,
+             self.road.num_def_lanes, lane_change_randoms, self.completed, self.n_completed)
 
-            for k in range(self.road.num_def_lanes+self.road.num_sd_lanes):
-                if self.road.get(k, i) != EMPTY:
-                    self.sim_driver(k, i) #Simulates all drivers starting at the end of the highway and starting with the leftmost lane then moving right
+        #Store data for the drivers that reached the end of the highway
+        for lane in range(num_lanes):
+            for car_id in self.completed[lane, :self.n_completed[lane]]:
+                self.data[self.num_finished] = cars.output_data(car_id, self.current_step)
+                self.num_finished += 1
 
         #Generate some new drivers at the beginning of the highway
-        self.num_cars = self.gen_new_drivers(self.num_cars)
-
-    def sim_driver(self, lane, i):
-        driver = self.road.get(lane, i)
-
-        #If the driver reaches the end of the highway then remove them and store data
-        if driver.speed + i >= self.road.length - 1:
-            self.road.set(lane, i, EMPTY)
-            driver.final_time = self.current_step
-            driver.final_dist = HIGHWAY_LENGTH
-            driver.travel_time = driver.final_time - driver.arrive_time
-            driver.avg_speed = driver.final_dist/driver.travel_time
-            self.data.append(driver.output_data())
-            return
-
-        #Decides if a car that wants to do a lane change will go left or right
-        r = random.random()
-        if driver.desire == LANE_CHANGE and r <= LEFT_LANE_CHANGE_PROBABILITY:
-            if self.road.safe_left_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_LEFT
-            elif self.road.safe_right_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_RIGHT
-        elif driver.desire == LANE_CHANGE and r > LEFT_LANE_CHANGE_PROBABILITY:
-            if self.road.safe_right_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_RIGHT
-            elif self.road.safe_left_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_LEFT
-
-        #Performs lane change if necessary then calls cruise method
-        if driver.desire == LANE_CHANGE_RIGHT:
-            self.road.set(lane + 1, i, driver)
-            self.road.set(lane, i, EMPTY)
-            driver.desire = CRUISE
-            self.sim_cruise(lane + 1, i)
-                
-        elif driver.desire == LANE_CHANGE_LEFT:
-            self.road.set(lane - 1, i, driver)
-            self.road.set(lane, i, EMPTY)
-            driver.desire = CRUISE
-            self.sim_cruise(lane - 1, i)
-            
-        elif driver.desire == CRUISE or driver.desire == LANE_CHANGE:
-            self.sim_cruise(lane, i)
-
-    #Moves car forward depending on its speed and how much room is infront of it, also sets desire to lane change if there is no room in front
-    def sim_cruise(self, lane, i):
-        driver = self.road.get(lane, i)
-        x = self.road.safe_distance_within(lane, i, driver.speed + driver.safe_follow)
-
-        #If there is enough room for the car to move forward at full speed
-        if x == driver.speed + driver.safe_follow:
-            self.road.set(lane, i + driver.speed, driver) #Car moves forward by full speed
-        elif x > driver.safe_follow:
-            driver.desire = LANE_CHANGE
-            self.road.set(lane, i + x - driver.safe_follow, driver) #Car moves forward just enough to maintain safe_distance
-        else:
-            driver.desire = LANE_CHANGE
-            self.road.set(lane, i + 1, driver) #Car moves forward by just 1 spot
-        self.road.set(lane, i, EMPTY)
+        self.num_cars = self.gen_new_drivers(self.num_cars, gen_randoms)
+
+    #Places a new car on the highway at the specified position
+    def add_car(self, lane, index, car_id, speed, is_human):
+        self.cars.add(car_id, speed, self.current_step, is_human)
+        self.road.set(lane, index, car_id)
+
+    #Outputs an array with a row of data for each car that reached the end of the highway
+    def output_data(self):
+        return self.data[:self.num_finished]
 
     #Generates a new driver for each lane depending on the given probabilities
-    def gen_new_drivers(self, num_cars):
+    #randoms holds the two random numbers each lane may need to decide whether a car is generated and how fast it is
+    def gen_new_drivers(self, num_cars, randoms):
         is_human = True
         current_car_id = num_cars
         for lane in range(self.road.num_def_lanes):
-            r = random.random()
             #Can adjust car probability in order to have a higher chance of generating a car each time
-            if r < DEF_CAR_PROBABILITY:
-                r = random.random()
-
+            if randoms[lane, 0] < DEF_CAR_PROBABILITY:
                 is_human = True  #  assume only human driven cars are in the normal lanes
-                
-                
+                current_car_id += 1 #Car ids start at 1 since 0 marks an empty spot on the road
+
                 #Can adjust fast probability in order to have a higher chance of generating a fast or slow car each time
-                if r < FAST_PROBABILITY:
-                    self.road.set(lane, 0, Driver(current_car_id, FAST, self.current_step, is_human))
+                if randoms[lane, 1] < FAST_PROBABILITY:
+                    self.add_car(lane, 0, current_car_id, FAST, is_human)
                 else:
-                    self.road.set(lane, 0, Driver(current_car_id, SLOW, self.current_step, is_human))
-                current_car_id += 1
+                    self.add_car(lane, 0, current_car_id, SLOW, is_human)
 
         for lane in range(self.road.num_sd_lanes):
-            r = random.random()
             #Can adjust car probability in order to have a higher chance of generating a car each time
-            if r < SD_CAR_PROBABILITY:
-                r = random.random()
-
+            if randoms[self.road.num_def_lanes + lane, 0] < SD_CAR_PROBABILITY:
                 is_human = False  #   only autonomous cars are in the sd lanes
-                
-                # self driving cars are all fast
-                self.road.set(lane+self.road.num_def_lanes-1, 0, Driver(current_car_id, FAST, self.current_step, is_human))
-
                 current_car_id += 1
 
+                # self driving cars are all fast
+                self.add_car(lane+self.road.num_def_lanes-1, 0, current_car_id, FAST, is_human)
+
         return current_car_id
 
     #Plots the average speeds of each car in a bar graph
     def plot_avg_speed(self):
-        car_IDs = []
-        avg_speeds = []
-        for i in self.data:
-            car_IDs.append(i[0])
-            avg_speeds.append(i[-1])
-        min_speed = min(avg_speeds)
-        max_speed = max(avg_speeds)
-        diffs = (max_speed - min_speed)/NUM_BARS
-        y_values = []
-        for i in range(NUM_BARS):
-            y_values.append(0)
-            for speed in avg_speeds:
-                if i == 0:
-                    if speed >= (min_speed + i*diffs) and speed <= (min_speed + (1 + i)*diffs):
-                        y_values[i] += 1
-                else:
-                    if speed > (min_speed + i*diffs) and speed <= (min_speed + (1 + i)*diffs):
-                        y_values[i] += 1
-        x_values = []
-        for i in range(NUM_BARS):
-            x_values.append(min_speed + i*diffs)
-        plt.bar(x_values, y_values, width = diffs, align = 'edge')
+        avg_speeds = self.output_data()[:, -1]
+        y_values, edges = np.histogram(avg_speeds, bins=NUM_BARS)
+        plt.bar(edges[:-1], y_values, width = np.diff(edges), align = 'edge')
         plt.show()
 
 #Test function
@@ -1,7 +1,9 @@
-import random
+import multiprocessing
+import sys
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
+from numba import njit
 
 """
 2PX3 Highway Simulation Starting Code 
@@ -15,7 +17,7 @@ See the video for more detail.
 Dr. Vincent Maccio 2022-02-01 
 """
 
-EMPTY = " "
+EMPTY = 0
 
 """
 The following variables control the different factors of the simulation.
@@ -38,16 +40,14 @@ SDC_SAFE_FOLLOW = 2
 LANE_CHANGE_SAFE_BACK = FAST
 LANE_CHANGE_SAFE_FORWARD = FAST
 
+OFF_HIGHWAY = -1 #Position of a car that has reached the end of the highway
+
 #Desires:
-CRUISE = "Cruise"
-LANE_CHANGE = "Lane Change"
-LANE_CHANGE_LEFT = "Left Lane Change"
-LANE_CHANGE_RIGHT = "Right Lane Change"
+CRUISE = 0
+LANE_CHANGE = 1
 LEFT_LANE_CHANGE_PROBABILITY = 0.5 #Probability that a car that wants to perform a lane change will pick to go left
 
 #Car generation options
-def_car_prob = 0.1
-sd_car_prob = 0.1
 DEF_CAR_PROBABILITY = 0.25
 SD_CAR_PROBABILITY = 0.25
 FAST_PROBABILITY = 0.5
@@ -60,39 +60,183 @@ CRASH_PROB = 0.001
 
 #Simulation options
 NUM_TIME_STEPS = 10000
+CAR_PROBABILITIES = [car_prob/100 for car_prob in range(5,100,5)] #Car probabilities swept by main, each one is simulated in its own process
+NUM_REPLICAS = 1 #Number of independent simulations main runs for each car probability; the crashes printed are totals over all of them
 PRINT_ROAD = False
 NUM_BARS = 15 #Number of bars in the output bar graph
 
-#Class for each car
-class Driver:
-
-    def __init__(self, car_id, speed, arrive_time, is_human, is_drunk):
-        self.id = car_id
-        self.desire = CRUISE
-        self.is_human = is_human
-        self.speed = speed
-        self.is_drunk = is_drunk
-        if is_human:
-            self.safe_follow = HUMAN_SAFE_FOLLOW
+"""
+Compiled kernels over the occupancy grid. The grid holds the id of the car at each position (EMPTY where there is none)
+and everything the kernels need to know about a car is kept in the Simulation's per car arrays indexed by that id.
+The cells grid mirrors it with one byte per position (1 where there is a car), so scans for free spots read a quarter of the memory.
+Both grids have a wall row on either side of the default lanes and of the self-driving lanes. Walls are always full in cells,
+so a car can never change lanes into one and the lane change checks need no edge cases; lanes in the kernels are grid rows.
+The module constants used in the kernels (speeds, follow and lane change distances, probabilities) are compiled in as literals.
+"""
+
+#Sets the car id at the specified position, keeping the cells grid in step with the occupancy grid
+@njit(cache=True)
+def set_nb(occupancy, cells, lane, index, car_id):
+    occupancy[lane, index] = car_id
+    cells[lane, index] = car_id != EMPTY
+
+#Returns the index of the first car past index in each lane
+#A lane with no car past index gets 2*length, which is far enough past the end of the road that the lane always reads as clear
+@njit(cache=True)
+def next_car_after_nb(cells, index):
+    num_lanes, length = cells.shape
+    next_car = np.full(num_lanes, 2 * length, dtype=np.int64)
+    for lane in range(num_lanes):
+        for i in range(index + 1, length):
+            if cells[lane, i]:
+                next_car[lane] = i
+                break
+    return next_car
+
+#Returns the distance until the next car in the lane, from index within k; returns k if all spots are EMPTY
+#next_car holds the index of the first car past index in each lane, so this is a lookup instead of a scan
+@njit(cache=True)
+def safe_distance_within_nb(next_car, lane, index, k):
+    return min(next_car[lane] - index - 1, k)
+
+#Returns true if the spot at i in the given lane of the cells grid is free, along with the spots just behind and in front of it
+#next_car is the index of the first car past i in the lane, which covers the spots in front
+#Spots behind the start of the highway count as free
+@njit(cache=True)
+def lane_change_clear_nb(road, i, next_car):
+    if road[i] or next_car <= i + LANE_CHANGE_SAFE_FORWARD:
+        return False
+    for k in range(max(i - LANE_CHANGE_SAFE_BACK, 0), i):
+        if road[k]:
+            return False
+    return True
+
+#Returns true if it is safe to switch to the lane on the right of the car at position i
+#Cars never change lanes between the default and self-driving lanes, or off the edge of the highway, since those are walls
+@njit(cache=True)
+def safe_right_lane_change_nb(cells, next_car, lane, i):
+    return lane_change_clear_nb(cells[lane + 1], i, next_car[lane + 1])
+
+#Returns true if it is safe to switch to the lane on the left of the car at position i
+#Cars never change lanes between the default and self-driving lanes, or off the edge of the highway, since those are walls
+@njit(cache=True)
+def safe_left_lane_change_nb(cells, next_car, lane, i):
+    return lane_change_clear_nb(cells[lane - 1], i, next_car[lane - 1])
+
+#Places the car at position p of the given lane, which is not behind the sweep, and keeps next_car up to date
+@njit(cache=True)
+def place_ahead_nb(occupancy, cells, next_car, lane, p, car_id):
+    set_nb(occupancy, cells, lane, p, car_id)
+    next_car[lane] = min(next_car[lane], p)
+
+#Simulates the driver with the given id, recording its id in finals if it reaches the end of the highway
+#and its speed in crashes for every crash; counts holds the number of finals and crashes recorded so far
+#lane_of and pos_of hold the lane and position of every car, and are kept up to date as the car moves
+#The lane change and the cruise are worked out first, so the car's old spot is only cleared once and its new spot written once
+@njit(cache=True)
+def sim_driver_nb(occupancy, cells, next_car, lane_of, pos_of, speed, safe_follow, desire, crash_prob, car_id, finals, crashes, counts):
+    lane = lane_of[car_id]
+    i = pos_of[car_id]
+    set_nb(occupancy, cells, lane, i, EMPTY)
+
+    #If the driver reaches the end of the highway then remove them and store their id
+    if speed[car_id] + i >= occupancy.shape[1] - 1:
+        pos_of[car_id] = OFF_HIGHWAY
+        finals[counts[0]] = car_id
+        counts[0] += 1
+        return
+
+    #Decides if a car that wants to do a lane change will go left or right
+    r = np.random.random()
+
+    #A car that wants to change lanes goes to its preferred side if it is safe and to the other side otherwise
+    #The other side is only checked when the preferred one is not safe
+    new_lane = lane
+    if desire[car_id] == LANE_CHANGE:
+        if r <= LEFT_LANE_CHANGE_PROBABILITY:
+            if safe_left_lane_change_nb(cells, next_car, lane, i):
+                new_lane = lane - 1
+            elif safe_right_lane_change_nb(cells, next_car, lane, i):
+                new_lane = lane + 1
         else:
-            self.safe_follow = SDC_SAFE_FOLLOW
-        self.arrive_time = arrive_time
-        self.final_time = 0
-        self.travel_time = 0
-        self.final_dist = 0
-        self.avg_speed = speed
-
-    #Outputs an array with all of the data for the car
-    def output_data(self):
-        output_data = [self.id,
-                       self.speed,
-                       self.is_human,
-                       self.arrive_time,
-                       self.final_time,
-                       self.travel_time,
-                       self.final_dist,
-                       self.avg_speed]
-        return output_data
+            if safe_right_lane_change_nb(cells, next_car, lane, i):
+                new_lane = lane + 1
+            elif safe_left_lane_change_nb(cells, next_car, lane, i):
+                new_lane = lane - 1
+        if new_lane != lane:
+            desire[car_id] = CRUISE
+
+    #Moves car forward in its new lane depending on its speed and how much room is in front of it, also sets desire to lane change if there is no room in front
+    x = safe_distance_within_nb(next_car, new_lane, i, speed[car_id] + safe_follow[car_id])
+
+    #If there is enough room for the car to move forward at full speed
+    if x == speed[car_id] + safe_follow[car_id]:
+        new_i = i + speed[car_id] #Car moves forward by full speed
+
+    #If the car is not within unsafe following distance but cannot move forward by it's full speed
+    elif x > safe_follow[car_id]:
+        desire[car_id] = LANE_CHANGE
+        new_i = i + x - safe_follow[car_id] #Car moves forward just enough to maintain safe_distance
+    else:
+        desire[car_id] = LANE_CHANGE
+        new_i = i + min(x, 1) #Car moves forward by just 1 spot, unless that spot is taken
+    place_ahead_nb(occupancy, cells, next_car, new_lane, new_i, car_id)
+    lane_of[car_id] = new_lane
+    pos_of[car_id] = new_i
+
+    #Every car that stays on the highway rolls for a crash once per time step
+    r = np.random.random()
+    crashed = r < crash_prob[car_id]
+    if crashed:
+        crashes[counts[1]] = speed[car_id]
+        counts[1] += 1
+
+#Seeds the random number generator used inside the compiled kernels, which is separate from NumPy's own
+@njit(cache=True)
+def seed_nb(seed):
+    np.random.seed(seed)
+
+#Drops the cars that left the highway from the first num_live entries of live and puts the rest in sweep order:
+#furthest along the highway first, and from the leftmost lane to the rightmost for cars level with each other
+#Cars only pass each other by a few spots per time step and new cars are added at the end, so the list is nearly sorted
+#and an insertion sort is close to linear
+#Returns the number of cars left in live
+@njit(cache=True)
+def sort_live_nb(live, num_live, lane_of, pos_of):
+    m = 0
+    for n in range(num_live):
+        car_id = live[n]
+        if pos_of[car_id] == OFF_HIGHWAY:
+            continue
+        j = m
+        while j > 0 and (pos_of[live[j - 1]] < pos_of[car_id] or (pos_of[live[j - 1]] == pos_of[car_id] and lane_of[live[j - 1]] > lane_of[car_id])):
+            live[j] = live[j - 1]
+            j -= 1
+        live[j] = car_id
+        m += 1
+    return m
+
+#Moves every car on the highway forward by one time unit
+#live holds the ids of the cars on the highway in its first num_live entries
+#Returns the ids of the cars that reached the end of the highway, the speeds of the cars that crashed and the new number of live cars
+@njit(cache=True)
+def _execute_time_step(occupancy, cells, live, num_live, lane_of, pos_of, speed, safe_follow, desire, crash_prob):
+    num_lanes, length = occupancy.shape
+    finals = np.empty(num_lanes * length, dtype=np.int32)
+    crashes = np.empty(num_lanes * length, dtype=np.int32) #A car can crash at most once per time step
+    counts = np.zeros(2, dtype=np.int64)
+
+    #Index of the first car past the sweep in each lane
+    #Cars only ever move forward or sideways and every car is placed through place_ahead_nb, so this stays up to date as the sweep moves back
+    next_car = np.full(num_lanes, 2 * length, dtype=np.int64)
+
+    #Simulates all drivers starting at the end of the highway and starting with the leftmost lane then moving right
+    #Only the cars on the highway are visited, instead of every spot on it
+    num_live = sort_live_nb(live, num_live, lane_of, pos_of)
+    for n in range(num_live):
+        sim_driver_nb(occupancy, cells, next_car, lane_of, pos_of, speed, safe_follow, desire, crash_prob, live[n], finals, crashes, counts)
+
+    return finals[:counts[0]], crashes[:counts[1]], num_live
 
 #Highway class
 class Highway:
@@ -100,296 +244,210 @@ class Highway:
     def __init__(self, length, num_def_lanes, num_sd_lanes):
         self.num_def_lanes = num_def_lanes
         self.num_sd_lanes = num_sd_lanes
-        self.road = [] #2d array representing highway (each secondary array within the main array represents a lane)
-        for _ in range(num_def_lanes+num_sd_lanes):
-            self.road.append([]) #appends the number of lanes specified
-        
+        #Row of the grids holding each lane, leaving a wall row on either side of the default lanes and of the self-driving lanes
+        self.rows = np.concatenate((np.arange(num_def_lanes) + 1, np.arange(num_sd_lanes) + num_def_lanes + 2))
+        num_rows = num_def_lanes + num_sd_lanes + 3
+        #2d grid representing highway (each row represents a lane or a wall), holding the id of the car at each position or EMPTY where there is none
+        self.occupancy = np.zeros((num_rows, length), dtype=np.int32)
+        self.cells = np.ones((num_rows, length), dtype=np.uint8) #Same layout as occupancy, holding 1 where there is a car or a wall and 0 where the road is EMPTY
+        self.cells[self.rows] = 0
         self.length = length
-        for _ in range(length):
-            for i in range(num_def_lanes+num_sd_lanes):
-                self.road[i].append(EMPTY)
 
-    #Returns the value at the specified position within the specified lane
+    #Returns the id of the car at the specified position within the specified lane (EMPTY if there is none)
     def get(self, lane, index):
-        return self.road[lane][index]
+        return self.occupancy[self.rows[lane], index]
 
-    #Sets the value at the specified position within the specified lane
-    def set(self, lane, index, value):
-        self.road[lane][index] = value
+    #Sets the car id at the specified position within the specified lane
+    def set(self, lane, index, car_id):
+        set_nb(self.occupancy, self.cells, self.rows[lane], index, car_id)
 
     #Returns the distance until the next car, from index i within k; returns k if all spots are EMPTY
     def safe_distance_within(self, lane, index, k):
-        x = 0
-        for i in range(index + 1, index + k + 1):
-            if i >= self.length:
-                return k
-            if self.road[lane][i] != EMPTY:
-                return x
-            x += 1
-        return x
-
-    #Returns true if it is safe to switch to right lane (spot adjacent to the car's current position in the right lane is free, and so are the next 2 spaces)
+        return safe_distance_within_nb(next_car_after_nb(self.cells, index), self.rows[lane], index, k)
+
+    #Returns true if it is safe to switch to right lane (spot adjacent to the car's current position in the right lane is free, and so are the spaces around it)
     #Returns false otherwise
     def safe_right_lane_change(self, lane, i):
-        if lane == self.num_def_lanes - 1:
-            return False
-        safe_lane_change = True
-        if self.road[lane + 1][i] != EMPTY:
-            safe_lane_change = False
-        for k in range(i - 1, i - LANE_CHANGE_SAFE_BACK - 1, -1):
-            if self.road[lane + 1][k] != EMPTY:
-                safe_lane_change = False
-        for k in range(i + 1, i + LANE_CHANGE_SAFE_FORWARD + 1):
-            if self.road[lane + 1][k] != EMPTY:
-                safe_lane_change = False
-        return safe_lane_change
-
-    #Returns true if it is safe to switch to left lane (spot adjacent to the car's current position in the left lane is free, and so are the next 2 spaces)
+        return safe_right_lane_change_nb(self.cells, next_car_after_nb(self.cells, i), self.rows[lane], i)
+
+    #Returns true if it is safe to switch to left lane (spot adjacent to the car's current position in the left lane is free, and so are the spaces around it)
     #Returns false otherwise
     def safe_left_lane_change(self, lane, i):
-        if lane == 0:
-            return False
-        safe_lane_change = True
-        if self.road[lane - 1][i] != EMPTY:
-            safe_lane_change = False
-        for k in range(i - 1, i - LANE_CHANGE_SAFE_BACK - 1, -1):
-            if self.road[lane - 1][k] != EMPTY:
-                safe_lane_change = False
-        for k in range(i + 1, i + LANE_CHANGE_SAFE_FORWARD + 1):
-            if self.road[lane - 1][k] != EMPTY:
-                safe_lane_change = False
-        return safe_lane_change
+        return safe_left_lane_change_nb(self.cells, next_car_after_nb(self.cells, i), self.rows[lane], i)
     
     #Prints the current state of the highway- good to see the visual representation and for debugging
     def print(self):
-        s = "\n\n"
-        for k in range(self.num_def_lanes):
-            for i in range(self.length):
-                if self.road[k][i] == EMPTY:
-                    s += "_"
-                else:
-                    s += "C"
-            s += "\n"
-        for k in range(self.num_sd_lanes):
-            for i in range(self.length):
-                if self.road[k+self.num_def_lanes-1][i] == EMPTY:
-                    s += "~"
-                else:
-                    s += "S"
-            s += "\n"
-        print(s)
+        lanes = ["".join(np.where(self.cells[self.rows[k]], "C", "_")) for k in range(self.num_def_lanes)]
+        lanes += ["".join(np.where(self.cells[self.rows[k+self.num_def_lanes]], "S", "~")) for k in range(self.num_sd_lanes)]
+        sys.stdout.write("\n\n" + "".join(lane + "\n" for lane in lanes) + "\n")
 
 #Simulation class
 class Simulation:
-    def __init__(self, time_steps):
+    def __init__(self, time_steps, def_car_prob=DEF_CAR_PROBABILITY, sd_car_prob=SD_CAR_PROBABILITY, seed=None):
         self.road = Highway(HIGHWAY_LENGTH, NUM_DEF_LANES, NUM_SD_LANES)
+        self.rng = np.random.default_rng(seed)
+        if seed is not None:
+            seed_nb(seed) #The kernels draw the random numbers for each car from their own generator
         self.time_steps = time_steps
+        self.def_car_prob = def_car_prob
+        self.sd_car_prob = sd_car_prob
+        self.car_prob = np.array([def_car_prob]*NUM_DEF_LANES + [sd_car_prob]*NUM_SD_LANES) #Probability of generating a car in each lane every time step
         self.current_step = 0
         self.num_cars = 0
-        self.data = []
-        self.crashes = []
+
+        #Per car arrays indexed by car id (id 0 is never used since it marks an empty spot on the road)
+        max_cars = time_steps * (NUM_DEF_LANES + NUM_SD_LANES) + 1
+        self.speed = np.zeros(max_cars, dtype=np.int32)
+        self.safe_follow = np.zeros(max_cars, dtype=np.int32)
+        self.desire = np.zeros(max_cars, dtype=np.int8)
+        self.is_human = np.zeros(max_cars, dtype=np.bool_)
+        self.crash_prob = np.zeros(max_cars) #Probability of each car crashing in a time step, set from whether the driver is drunk when it spawns
+        self.lane_of = np.zeros(max_cars, dtype=np.int32)
+        self.pos_of = np.zeros(max_cars, dtype=np.int32)
+
+        #Ids of the cars on the highway, in the order they are simulated; besides the cars on the highway it only has to fit the new cars of one time step
+        self.live = np.empty((NUM_DEF_LANES + NUM_SD_LANES) * (HIGHWAY_LENGTH + 1), dtype=np.int32)
+        self.num_live = 0
+        self.arrive_time = np.zeros(max_cars, dtype=np.int32)
+
+        self.data = np.empty((max_cars, 8)) #One row of output data per car that reached the end of the highway, in the order they did
+        self.num_finished = 0
+        self.crashes = np.empty(1024, dtype=np.int32) #Speed of each car that crashed, in the order they did
+        self.num_crashes = 0
 
     #Method that runs the simulation
     def run(self):
-        while self.current_step < self.time_steps:
-            self.execute_time_step()
+        #Attributes and globals used every time step are looked up once here
+        execute_time_step = self.execute_time_step
+        print_road = self.road.print
+        time_steps = self.time_steps
+        show_road = PRINT_ROAD
+        while self.current_step < time_steps:
+            execute_time_step()
             self.current_step += 1
-            if PRINT_ROAD:
-                self.road.print()
+            if show_road:
+                print_road()
 
     #Move forward by one time unit
     def execute_time_step(self):
+        road = self.road
+        finals, crashes, self.num_live = _execute_time_step(road.occupancy, road.cells, self.live, self.num_live, self.lane_of, self.pos_of, self.speed, self.safe_follow, self.desire, self.crash_prob)
 
-        #Traverse through the length of the highway, beginning from the end and working backwards
-        for i in range(self.road.length - 1, -1, -1):
-
-            for k in range(self.road.num_def_lanes+self.road.num_sd_lanes):
-                if self.road.get(k, i) != EMPTY:
-                    self.sim_driver(k, i) #Simulates all drivers starting at the end of the highway and starting with the leftmost lane then moving right
+        #Most time steps have no cars leaving or crashing, so the NumPy calls to store them are skipped
+        if len(finals):
+            self.record_finished(finals)
+        if len(crashes):
+            self.record_crashes(crashes)
 
         #Generate some new drivers at the beginning of the highway
-        self.num_cars = self.gen_new_drivers(self.num_cars)
-
-    def sim_driver(self, lane, i):
-        driver = self.road.get(lane, i)
-
-        #If the driver reaches the end of the highway then remove them and store data
-        if driver.speed + i >= self.road.length - 1:
-            self.road.set(lane, i, EMPTY)
-            driver.final_time = self.current_step
-            driver.final_dist = HIGHWAY_LENGTH
-            driver.travel_time = driver.final_time - driver.arrive_time
-            driver.avg_speed = driver.final_dist/driver.travel_time
-            self.data.append(driver.output_data())
+        gen_randoms = self.rng.random((len(road.rows), 3))
+        self.gen_new_drivers(gen_randoms)
+
+    #Stores a row of output data for each of the given cars, which reached the end of the highway this time step
+    #The row holds the car's id, speed, is_human, arrive time, final time, travel time, final distance and average speed
+    #Every car reaches the end at most once, so the data array always has room
+    def record_finished(self, car_ids):
+        rows = self.data[self.num_finished:self.num_finished + len(car_ids)]
+        rows[:, 0] = car_ids
+        rows[:, 1] = self.speed[car_ids]
+        rows[:, 2] = self.is_human[car_ids]
+        rows[:, 3] = self.arrive_time[car_ids]
+        rows[:, 4] = self.current_step
+        rows[:, 5] = rows[:, 4] - rows[:, 3]
+        rows[:, 6] = HIGHWAY_LENGTH
+        rows[:, 7] = rows[:, 6]/rows[:, 5]
+        self.num_finished += len(car_ids)
+
+    #Stores the speeds of the cars that crashed this time step, doubling the size of the crashes array whenever it is full
+    def record_crashes(self, speeds):
+        while self.num_crashes + len(speeds) > len(self.crashes):
+            self.crashes = np.concatenate((self.crashes, np.empty_like(self.crashes)))
+        self.crashes[self.num_crashes:self.num_crashes + len(speeds)] = speeds
+        self.num_crashes += len(speeds)
+
+    #Outputs an array with the speed of each car that crashed
+    def crash_data(self):
+        return self.crashes[:self.num_crashes]
+
+    #Outputs an array with a row of data for each car that reached the end of the highway
+    def output_data(self):
+        return self.data[:self.num_finished]
+
+    #Places new cars at the start of the given lanes and returns their ids
+    #A car is only a set of entries in the per car arrays, so no object is allocated for it
+    def spawn_cars(self, lanes, speed, is_human, is_drunk):
+        car_ids = np.arange(self.num_cars + 1, self.num_cars + len(lanes) + 1) #Car ids start at 1 since 0 marks an empty spot on the road
+        self.num_cars += len(lanes)
+        self.speed[car_ids] = speed
+        self.safe_follow[car_ids] = np.where(is_human, HUMAN_SAFE_FOLLOW, SDC_SAFE_FOLLOW)
+        self.desire[car_ids] = CRUISE
+        self.is_human[car_ids] = is_human
+        self.crash_prob[car_ids] = np.where(is_drunk, DRUNK_CRASH_PROB, CRASH_PROB)
+        self.arrive_time[car_ids] = self.current_step
+        rows = self.road.rows[lanes]
+        self.lane_of[car_ids] = rows
+        self.pos_of[car_ids] = 0
+        self.road.occupancy[rows, 0] = car_ids
+        self.road.cells[rows, 0] = 1
+        self.live[self.num_live:self.num_live + len(car_ids)] = car_ids
+        self.num_live += len(car_ids)
+        return car_ids
+
+    #Generates a new driver for each lane depending on the given probabilities
+    #randoms holds the three random numbers each lane may need to decide whether a car is generated, how fast it is and whether the driver is drunk
+    def gen_new_drivers(self, randoms):
+        road = self.road
+
+        #Can adjust car probability in order to have a higher chance of generating a car each time
+        lanes = np.flatnonzero((randoms[:, 0] < self.car_prob) & (road.cells[road.rows, 0] == 0))
+        if not len(lanes):
             return
+        randoms = randoms[lanes]
 
-        #Decides if a car that wants to do a lane change will go left or right
-        r = random.random()
-
-        if driver.desire != CRUISE:  # potentially crash
-            r = random.random()
-            if driver.is_drunk:
-                if r < DRUNK_CRASH_PROB:
-                    self.crashes.append(driver.speed)
-            elif r < CRASH_PROB:
-                self.crashes.append(driver.speed)
-
-        if driver.desire == LANE_CHANGE and r <= LEFT_LANE_CHANGE_PROBABILITY:
-            if self.road.safe_left_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_LEFT
-            elif self.road.safe_right_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_RIGHT
-        elif driver.desire == LANE_CHANGE and r > LEFT_LANE_CHANGE_PROBABILITY:
-            if self.road.safe_right_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_RIGHT
-            elif self.road.safe_left_lane_change(lane, i):
-                driver.desire = LANE_CHANGE_LEFT
-
-        #Performs lane change if necessary then calls cruise method
-        if driver.desire == LANE_CHANGE_RIGHT:
-            
-            self.road.set(lane + 1, i, driver)
-            self.road.set(lane, i, EMPTY)
-            driver.desire = CRUISE
-            self.sim_cruise(lane + 1, i)
-                
-        elif driver.desire == LANE_CHANGE_LEFT:
-            self.road.set(lane - 1, i, driver)
-            self.road.set(lane, i, EMPTY)
-            driver.desire = CRUISE
-            self.sim_cruise(lane - 1, i)
-            
-        
-        elif driver.desire == CRUISE or driver.desire == LANE_CHANGE:
-            self.sim_cruise(lane, i)
-
-    #Moves car forward depending on its speed and how much room is infront of it, also sets desire to lane change if there is no room in front
-    def sim_cruise(self, lane, i):
-        driver = self.road.get(lane, i)
-        x = self.road.safe_distance_within(lane, i, driver.speed + driver.safe_follow)
-
-        #If there is enough room for the car to move forward at full speed
-        if x == driver.speed + driver.safe_follow:
-            self.road.set(lane, i + driver.speed, driver) #Car moves forward by full speed
-        elif x > driver.safe_follow:
-            driver.desire = LANE_CHANGE
-            self.road.set(lane, i + x - driver.safe_follow, driver) #Car moves forward just enough to maintain safe_distance
-        
-        r = random.random()
-        if driver.is_drunk:
-            if r < DRUNK_CRASH_PROB:
-                self.crashes.append(driver.speed)
-        elif r < CRASH_PROB:
-            self.crashes.append(driver.speed)
+        #Only human driven cars are in the normal lanes and only autonomous cars are in the sd lanes
+        is_human = lanes < road.num_def_lanes
 
-        else:
-            driver.desire = LANE_CHANGE
-            self.road.set(lane, i + 1, driver) #Car moves forward by just 1 spot
-        self.road.set(lane, i, EMPTY)
+        #Can adjust fast probability in order to have a higher chance of generating a fast or slow car each time
+        #Self driving cars are all fast and sober
+        speed = np.where(is_human & (randoms[:, 1] >= FAST_PROBABILITY), SLOW, FAST)
+        is_drunk = is_human & (randoms[:, 2] < DRUNK_PROBABILITY)
 
-    #Generates a new driver for each lane depending on the given probabilities
-    def gen_new_drivers(self, num_cars):
-        global def_car_prob
-        global sd_car_prob
-        
-        is_human = True
-        current_car_id = num_cars
-        for lane in range(self.road.num_def_lanes):
-            r = random.random()
-            #Can adjust car probability in order to have a higher chance of generating a car each time
-            if r < def_car_prob:
-                r = random.random()
-
-                is_human = True  #  assume only human driven cars are in the normal lanes
-                
-                
-                #Can adjust fast probability in order to have a higher chance of generating a fast or slow car each time
-                if r < FAST_PROBABILITY:
-                    r = random.random()
-                    if r < DRUNK_PROBABILITY:
-                        self.road.set(lane, 0, Driver(current_car_id, FAST, self.current_step, is_human,True)) # fast drunk
-                    else:
-                        self.road.set(lane, 0, Driver(current_car_id, FAST, self.current_step, is_human,False)) # fast
-                else:
-                    r = random.random()
-                    if r < DRUNK_PROBABILITY:
-                        self.road.set(lane, 0, Driver(current_car_id, SLOW, self.current_step, is_human,True)) # slow drunk
-                    else:
-                        self.road.set(lane, 0, Driver(current_car_id, SLOW, self.current_step, is_human,False)) # slow
-                current_car_id += 1
-
-        for lane in range(self.road.num_sd_lanes):
-            r = random.random()
-            #Can adjust car probability in order to have a higher chance of generating a car each time
-            if r < sd_car_prob:
-                r = random.random()
-
-                is_human = False  #   only autonomous cars are in the sd lanes
-                
-                # self driving cars are all fast and sober
-                self.road.set(lane+self.road.num_def_lanes-1, 0, Driver(current_car_id, FAST, self.current_step, is_human, False))
-
-                current_car_id += 1
-
-        return current_car_id
+        self.spawn_cars(lanes, speed, is_human, is_drunk)
 
     #Plots the average speeds of each car in a bar graph
     def plot_avg_speed(self):
-        car_IDs = []
-        avg_speeds = []
-        for i in self.data:
-            car_IDs.append(i[0])
-            avg_speeds.append(i[-1])
-        min_speed = min(avg_speeds)
-        max_speed = max(avg_speeds)
-        diffs = (max_speed - min_speed)/NUM_BARS
-        y_values = []
-        for i in range(NUM_BARS):
-            y_values.append(0)
-            for speed in avg_speeds:
-                if i == 0:
-                    if speed >= (min_speed + i*diffs) and speed <= (min_speed + (1 + i)*diffs):
-                        y_values[i] += 1
-                else:
-                    if speed > (min_speed + i*diffs) and speed <= (min_speed + (1 + i)*diffs):
-                        y_values[i] += 1
-        x_values = []
-        for i in range(NUM_BARS):
-            x_values.append(min_speed + i*diffs)
-        plt.bar(x_values, y_values, width = diffs, align = 'edge')
+        avg_speeds = self.output_data()[:, -1]
+        y_values, edges = np.histogram(avg_speeds, bins=NUM_BARS)
+        plt.bar(edges[:-1], y_values, width = np.diff(edges), align = 'edge')
         plt.show()
 
     def avg_travel_time_both_types(self):
-        avg_human_time=0
-        avg_sd_time =0
-
-        num_human=0
-        num_sd=0
-        # driver output data[2] represents the is human variable
-        for i in self.data:
-            if (i[2]):  # if human
-                avg_human_time+=i[5]
-                num_human+=1 
-            else:
-                avg_sd_time+=i[5]
-                num_sd+=1
-
-        return [avg_human_time/num_human,avg_sd_time/num_sd]
-        
+        data = self.output_data()
+        # driver output data[2] represents the is human variable and data[5] the travel time
+        is_human = data[:, 2] != 0
+        return [data[is_human, 5].mean(), data[~is_human, 5].mean()]
+
+
+#Runs one simulation with the given car probability in both the default and self-driving lanes
+#Returns the number of crashes and the sum of their severities
+def run_one(car_prob, replica=0):
+    #Each car probability and replica gets its own seed so the runs are reproducible and independent of each other
+    sim = Simulation(NUM_TIME_STEPS, car_prob, car_prob, seed=round(car_prob*100) + 100*replica)
+    sim.run()
+    crashes = sim.crash_data()
+    return len(crashes), int(crashes.sum())
 
 #Test function
 def main():
-    global def_car_prob
-    global sd_car_prob
-    for car_prob in range(5,100,5):
-        def_car_prob=car_prob/100
-        sd_car_prob=car_prob/100
-        sim = Simulation(NUM_TIME_STEPS)
-        sim.run()
-        print("num crashes:\t", len(sim.crashes) , "\tcar prob:  ",car_prob/100, "\tAvg severity  ",sum(sim.crashes)/len(sim.crashes))
+    #The simulations share no state, so they are run in parallel, one per process
+    runs = [(car_prob, replica) for car_prob in CAR_PROBABILITIES for replica in range(NUM_REPLICAS)]
+    with multiprocessing.Pool() as pool:
+        results = np.array(pool.starmap(run_one, runs)).reshape(len(CAR_PROBABILITIES), NUM_REPLICAS, 2).sum(axis=1)
+    for car_prob, (num_crashes, total_severity) in zip(CAR_PROBABILITIES, results):
+        print("num crashes:\t", num_crashes , "\tcar prob:  ",car_prob, "\tAvg severity  ",total_severity/num_crashes)
 
-        #print(sim.avg_travel_time_both_types(), "car prob:  ",car_prob/100)
+        #print(sim.avg_travel_time_both_types(), "car prob:  ",car_prob)
 
-    
 
-main()
+if __name__ == "__main__":
+    main()